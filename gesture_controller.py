@@ -2,24 +2,209 @@ import cv2
 import time
 import json
 import sys
-import math
-import uuid
 from collections import deque, Counter
 import paho.mqtt.client as mqtt
 from mqtt.config import MQTTConfig
 import numpy as np
 import os
+import queue
+import threading
 
 try:
     import mediapipe as mp
+    from mediapipe.framework.formats import landmark_pb2
     MEDIAPIPE_AVAILABLE = True
 except ImportError:
     print("Error: MediaPipe is required but not installed. Exiting.")
     sys.exit(1)
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit: leave the function as plain Python"""
+        return lambda func: func
+
+# orjson is optional; it serializes straight to bytes, which paho publishes as-is
+try:
+    from orjson import dumps as encode_json
+except ImportError:
+    def encode_json(obj):
+        return json.dumps(obj).encode()
+
 # Constants
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
+# Inference input size. Landmarks come back normalized, so MediaPipe can run on a
+# downscaled copy while the debug overlay keeps drawing on the full-size frame
+INFERENCE_WIDTH = 320
+INFERENCE_HEIGHT = 240
+RESULT_QUEUE_SIZE = 2            # detections buffered for the main loop; older ones are dropped
+FRAME_TIMEOUT = 1.0              # seconds to wait on the capture or detection thread
+DEBUG_STATUS_FRAMES = 30         # console status line every ~1.5 seconds at 20 FPS
+OVERLAY_MIN_INTERVAL = 1 / 15    # seconds between debug window redraws (15 FPS max)
+MQTT_CONNECT_TIMEOUT = 5.0       # max seconds setup_mqtt() waits for the broker's CONNACK
+CAMERA_RETRY_DELAY = 0.01        # seconds between grab() retries after a failed grab
+CAMERA_REOPEN_FAILURES = 100     # consecutive failed grabs (~1 s) before the camera is reopened
+CAMERA_REOPEN_MAX_FAILURES = 800 # reopen backoff doubles up to this many failed grabs (~8 s)
+
+# Run detection on every Nth camera frame only (1 = every frame). Skipped frames are
+# grabbed but never decoded; stability windows count processed frames, so they stretch by N.
+FRAME_STRIDE = max(1, int(os.environ.get('GESTURE_FRAME_STRIDE', '1')))
+
+# MediaPipe Hands reuses the previous frame's landmarks as the next ROI and only
+# re-runs palm detection when tracking confidence drops below this threshold
+MIN_DETECTION_CONFIDENCE = 0.5   # Lowered for better detection
+MIN_TRACKING_CONFIDENCE = 0.3    # Lowered for better tracking
+MODEL_COMPLEXITY = 0             # Lite landmark model: ~2x faster, plenty for finger counting
+
+# Path to a MediaPipe Tasks `hand_landmarker.task` bundle. When set, inference runs
+# asynchronously through HandLandmarker in LIVE_STREAM mode instead of the legacy
+# Solutions graph, so process_frame() no longer blocks on the forward pass.
+HAND_LANDMARKER_MODEL = os.environ.get('HAND_LANDMARKER_MODEL', '')
+# Set to 1 to try the TFLite GPU delegate first; falls back to CPU if it cannot be created
+HAND_LANDMARKER_GPU = os.environ.get('HAND_LANDMARKER_GPU') == '1'
+
+# Set to 1 to run the BGR->RGB conversion through OpenCL (cv2.UMat) on an integrated GPU.
+# Off by default: on CPU-only boards the upload/download costs more than the conversion.
+USE_OPENCL = os.environ.get('GESTURE_USE_OPENCL') == '1'
+
+# Landmark indices for index, middle, ring and pinky fingers
+FINGER_TIPS = np.array([8, 12, 16, 20])
+FINGER_DIPS = np.array([7, 11, 15, 19])
+
+FINGER_PIPS = np.array([6, 10, 14, 18])
+FINGER_MCPS = np.array([5, 9, 13, 17])
+
+# A finger counts as extended when MCP->PIP and PIP->tip bend less than 60 degrees
+FINGER_STRAIGHT_COS = 0.5
+FINGER_STRAIGHT_COS_SQ = FINGER_STRAIGHT_COS ** 2
+
+# Segment endpoints averaged by measure_hand_scale(): palm height, palm width, thumb-to-pinky span
+HAND_SCALE_FROM = np.array([0, 5, 1])
+HAND_SCALE_TO = np.array([9, 17, 17])
+
+# An action must appear in this many of the last ACTION_HISTORY_FRAMES frames before it is reported
+ACTION_HISTORY_FRAMES = 3
+ACTION_CONFIRM_FRAMES = 2
+
+# Codes returned by classify_action(); index 0 means no action gesture
+ACTION_GESTURES = (None, "OPEN_HAND", "FIST", "POINT_LEFT", "POINT_RIGHT")
+
+# Recent action codes are packed into one int, ACTION_CODE_BITS per frame (newest lowest)
+ACTION_CODE_BITS = 3
+ACTION_HISTORY_MASK = (1 << (ACTION_CODE_BITS * ACTION_HISTORY_FRAMES)) - 1
+
+
+def _build_action_votes():
+    """Lookup table: packed action history -> code seen in at least ACTION_CONFIRM_FRAMES frames, or 0"""
+    code_mask = (1 << ACTION_CODE_BITS) - 1
+    votes = []
+    for history in range(ACTION_HISTORY_MASK + 1):
+        counts = Counter((history >> (ACTION_CODE_BITS * i)) & code_mask for i in range(ACTION_HISTORY_FRAMES))
+        winners = [code for code, count in counts.items() if code and count >= ACTION_CONFIRM_FRAMES]
+        votes.append(winners[0] if winners else 0)
+    return tuple(votes)
+
+
+ACTION_VOTES = _build_action_votes()
+
+
+@njit(cache=True, fastmath=True)
+def measure_hand_scale(pts):
+    """Average of palm height (wrist -> middle MCP), palm width (index -> pinky MCP)
+    and thumb-to-pinky span in (21, 2) landmark points, for more stable scaling"""
+    total = 0.0
+    for i in range(3):
+        dx = pts[HAND_SCALE_TO[i], 0] - pts[HAND_SCALE_FROM[i], 0]
+        dy = pts[HAND_SCALE_TO[i], 1] - pts[HAND_SCALE_FROM[i], 1]
+        total += np.sqrt(dx * dx + dy * dy)
+    return total / 3
+
+
+@njit(cache=True, fastmath=True)
+def count_fingers(pts, hand_scale):
+    """Count extended fingers (0-5) in (21, 2) landmark points"""
+    total_fingers = 0
+
+    # Robust finger detection using vector-based approach: a finger is extended when
+    # the MCP->PIP and PIP->tip segments are roughly in line (works with different orientations)
+    # All lengths are compared squared, so the kernel needs no sqrt
+    for i in range(4):
+        tip, pip, mcp = FINGER_TIPS[i], FINGER_PIPS[i], FINGER_MCPS[i]
+        ax = pts[pip, 0] - pts[mcp, 0]
+        ay = pts[pip, 1] - pts[mcp, 1]
+        bx = pts[tip, 0] - pts[pip, 0]
+        by = pts[tip, 1] - pts[pip, 1]
+        len1_sq = ax * ax + ay * ay
+        len2_sq = bx * bx + by * by
+        if len1_sq > 0 and len2_sq > 0:
+            # cos(angle) > FINGER_STRAIGHT_COS, i.e. dot > cos * |a| * |b|, squared
+            dot_product = ax * bx + ay * by
+            total_fingers += dot_product > 0 and dot_product * dot_product > FINGER_STRAIGHT_COS_SQ * len1_sq * len2_sq
+        else:
+            # Fall back to a simple length check when a segment is too small to give an angle
+            total_fingers += len2_sq > 0.05 * 0.05
+
+    # Thumb is extended if ANY of these conditions are met (more lenient):
+    # far from its base, away from the palm center, or away from the index MCP
+    tx = pts[4, 0]
+    ty = pts[4, 1]
+    palm_x = (pts[0, 0] + pts[9, 0]) / 2
+    palm_y = (pts[0, 1] + pts[9, 1]) / 2
+    base_dx, base_dy = tx - pts[2, 0], ty - pts[2, 1]
+    palm_dx, palm_dy = tx - palm_x, ty - palm_y
+    index_dx, index_dy = tx - pts[5, 0], ty - pts[5, 1]
+    if (base_dx * base_dx + base_dy * base_dy > (hand_scale * 0.6) ** 2 or
+            palm_dx * palm_dx + palm_dy * palm_dy > (hand_scale * 0.8) ** 2 or
+            index_dx * index_dx + index_dy * index_dy > (hand_scale * 0.4) ** 2):
+        total_fingers += 1
+
+    return total_fingers
+
+
+@njit(cache=True, fastmath=True)
+def classify_action(pts, hand_scale):
+    """Classify (21, 2) landmark points into an ACTION_GESTURES index, checked in fixed order"""
+    # Index, middle, ring, pinky: tip above its DIP joint
+    fingers = pts[FINGER_TIPS, 1] < pts[FINGER_DIPS, 1]
+    total_fingers = fingers.sum()
+
+    dx = pts[4, 0] - pts[17, 0]
+    dy = pts[4, 1] - pts[17, 1]
+    thumb_reach = hand_scale * 1.3
+    thumb_extended = dx * dx + dy * dy > thumb_reach * thumb_reach  # squared, no sqrt
+
+    if total_fingers == 4 and thumb_extended:
+        return 1  # OPEN_HAND
+    if total_fingers == 1 and fingers[0] and not thumb_extended:
+        # Only index finger is up
+        tip_to_mcp_x = pts[8, 0] - pts[5, 0]
+        tip_to_wrist_x = pts[8, 0] - pts[0, 0]
+        avg_delta_x = tip_to_mcp_x * 0.6 + tip_to_wrist_x * 0.4
+        if avg_delta_x < -hand_scale * 0.2:
+            return 3  # POINT_LEFT
+        return 4  # POINT_RIGHT, also the default when the direction is ambiguous
+    if total_fingers == 0:
+        return 2  # FIST
+    return 0
+
+# Last formatted wall-clock second, see now_str()
+_ts_sec = 0
+_ts_str = ''
+
+
+def now_str():
+    """Current time as HH:MM:SS, formatted at most once per second"""
+    global _ts_sec, _ts_str
+    sec = int(time.time())
+    if sec != _ts_sec:
+        _ts_sec = sec
+        _ts_str = time.strftime('%H:%M:%S', time.localtime(sec))
+    return _ts_str
 
 # Auto-detect if we can display GUI (disable if running headless/SSH)
 def check_display_available():
@@ -30,184 +215,369 @@ def check_display_available():
         return False
     return True
 
-DEBUG_OVERLAY = check_display_available()  # Auto-detect based on environment
+# Auto-detect based on environment; GESTURE_DEBUG=0 skips drawing even when a display is present
+DEBUG_OVERLAY = os.environ.get('GESTURE_DEBUG') != '0' and check_display_available()
+
+
+class CameraStream:
+    """Reads the camera on its own thread so frame decode overlaps with inference"""
+
+    def __init__(self, src=0, stride=FRAME_STRIDE):
+        self.src = src
+        self.cap = self._open(verbose=True)
+        if not self.cap.isOpened():
+            raise IOError("Cannot open webcam. Ensure camera module is connected and enabled.")
+
+        # Single slot: a newer frame replaces one that hasn't been read yet
+        self.frame = None
+        self.frame_id = 0
+        self._read_id = 0
+        self.lock = threading.Condition()
+        self.stopped = False
+        self.thread = None
+        self.stride = stride
+
+    def _open(self, verbose=False):
+        """Open the camera and apply the capture settings; verbose reports settings the backend ignored"""
+        cap = cv2.VideoCapture(self.src)
+        cap.set(3, CAMERA_WIDTH)
+        cap.set(4, CAMERA_HEIGHT)
+        # MJPG decodes faster than raw YUYV, and a 1-frame driver queue keeps frames fresh.
+        # Some backends ignore either request; the capture thread still only keeps the newest frame.
+        if not cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG')) and verbose:
+            print("[INFO] Camera backend ignored the MJPG request; using its default format")
+        if not cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) and verbose:
+            print("[INFO] Camera backend ignored CAP_PROP_BUFFERSIZE=1")
+        return cap
+
+    def start(self):
+        """Start the capture thread; returns self so it can be chained onto the constructor"""
+        self.thread = threading.Thread(target=self._update, daemon=True)
+        self.thread.start()
+        return self
+
+    def _update(self):
+        grabbed = 0
+        failures = 0
+        reopen_after = CAMERA_REOPEN_FAILURES
+        while not self.stopped:
+            if not self.cap.grab():
+                failures += 1
+                if failures >= reopen_after:
+                    # A camera that stops delivering (USB reset, driver hiccup) rarely recovers on
+                    # its own; reopening it does. While it stays gone, retry less and less often.
+                    if reopen_after == CAMERA_REOPEN_FAILURES:
+                        print("[CAMERA] No frames from the camera, reopening it")
+                    self.cap.release()
+                    self.cap = self._open()
+                    if self.stopped:
+                        # stop() gave up waiting while the open blocked, so it released the old capture
+                        self.cap.release()
+                        break
+                    failures = 0
+                    reopen_after = min(reopen_after * 2, CAMERA_REOPEN_MAX_FAILURES)
+                time.sleep(CAMERA_RETRY_DELAY)
+                continue
+            if reopen_after != CAMERA_REOPEN_FAILURES:
+                print("[CAMERA] Camera is delivering frames again")
+                reopen_after = CAMERA_REOPEN_FAILURES
+            failures = 0
+            grabbed += 1
+            if grabbed % self.stride:
+                continue  # dequeued from the driver but not decoded
+            success, frame = self.cap.retrieve()
+            if not success:
+                continue
+            with self.lock:
+                self.frame = frame
+                self.frame_id += 1
+                self.lock.notify_all()
+
+    def read(self, timeout=FRAME_TIMEOUT):
+        """Return the newest frame not returned before, waiting for one if needed (None on timeout)"""
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.frame_id != self._read_id, timeout):
+                return None
+            self._read_id = self.frame_id
+            return self.frame
+
+    def stop(self):
+        """Stop the capture thread and release the camera"""
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join(timeout=FRAME_TIMEOUT)
+        self.cap.release()
+
 
 class GestureRecognizer:
     def __init__(self):
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=1,
-            min_detection_confidence=0.5,  # Lowered for better detection
-            min_tracking_confidence=0.3    # Lowered for better tracking
-        )
+        self.hands = None
+        self.landmarker = None
+        self._result_lock = threading.Lock()
+        self._latest_result = (None, 0.0)  # (landmarks, confidence) from the last callback
+        self._last_timestamp_ms = 0
+        if HAND_LANDMARKER_MODEL:
+            self.landmarker = self._create_landmarker()
+        else:
+            self.hands = self._create_hands()
         self.mp_draw = mp.solutions.drawing_utils
         
-        self.cap = cv2.VideoCapture(0) 
-        if not self.cap.isOpened():
-            raise IOError("Cannot open webcam. Ensure camera module is connected and enabled.")
-
-        self.cap.set(3, CAMERA_WIDTH)
-        self.cap.set(4, CAMERA_HEIGHT)
+        self.stream = CameraStream(0).start()
+
+        # Reused RGB buffer for the model input; BGR frames are handed to the main
+        # thread through the result queue, so those are allocated per frame
+        self._small_buf = np.empty((INFERENCE_HEIGHT, INFERENCE_WIDTH, 3), dtype=np.uint8)
+        self._rgb_buf = np.empty((INFERENCE_HEIGHT, INFERENCE_WIDTH, 3), dtype=np.uint8)
+        self._use_opencl = USE_OPENCL and cv2.ocl.haveOpenCL()
+        if self._use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+
+        # Background detection (see start()); the lock guards the MediaPipe graph across reset_camera()
+        self._inference_lock = threading.Lock()
+        self._results = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+        self._worker = None
+        self._running = False
         
         # State management
         self.current_frame = None
         self.hand_landmarks = None
-        self.last_gesture = None
+        self.landmark_points = None  # (21, 2) float32 x/y copy of hand_landmarks
+        self._hand_scale = None      # get_hand_scale() result for landmark_points, computed on first use
         self.finger_count_buffer = deque(maxlen=40)  # Support up to 2 seconds at 20 FPS
-        self.action_buffer = deque(maxlen=3)
+        self._clear_finger_counts()
+        self.action_history = 0  # packed classify_action() codes, see ACTION_VOTES
         
         # Confidence tracking
         self.detection_confidence = 0.0
         self.finger_count_stable_frames = 0
         self.debug_enabled = DEBUG_OVERLAY  # Instance variable instead of global
+        self._last_overlay_time = 0.0
 
-    def process_frame(self):
-        """Read and process a single frame, storing results for all detection methods"""
-        success, img = self.cap.read()
-        if not success:
-            self.current_frame = None
-            self.hand_landmarks = None
-            return False
-        
-        self.current_frame = img
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(img_rgb)
-        
-        if results.multi_hand_landmarks and len(results.multi_hand_landmarks) > 0:
-            self.hand_landmarks = results.multi_hand_landmarks[0]
-            if results.multi_handedness:
-                self.detection_confidence = results.multi_handedness[0].classification[0].score
-            else:
-                self.detection_confidence = 0.7
-        else:
-            self.hand_landmarks = None
-            self.detection_confidence = 0.0
-        
-        return True
-
-    def get_hand_scale(self):
-        """Calculate hand scale based on palm dimensions for dynamic thresholds"""
-        if not self.hand_landmarks:
-            return 0.15
+        # Compile (or load from cache) the numba kernels now rather than on the first detected hand
+        warmup_points = np.zeros((21, 2), dtype=np.float32)
+        measure_hand_scale(warmup_points)
+        count_fingers(warmup_points, 0.15)
+        classify_action(warmup_points, 0.15)
 
-        lms = self.hand_landmarks.landmark
-
-        # More robust hand scale calculation
-        # Use distance from wrist to middle finger MCP (palm height)
-        wrist = np.array([lms[0].x, lms[0].y])
-        middle_mcp = np.array([lms[9].x, lms[9].y])
-        palm_height = np.linalg.norm(middle_mcp - wrist)
+    def _create_hands(self):
+        """Create a MediaPipe Hands graph in tracking (video) mode"""
+        return self.mp_hands.Hands(
+            static_image_mode=False,
+            max_num_hands=1,
+            model_complexity=MODEL_COMPLEXITY,
+            min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+            min_tracking_confidence=MIN_TRACKING_CONFIDENCE
+        )
 
-        # Use distance between index and pinky MCPs (palm width)
-        index_mcp = np.array([lms[5].x, lms[5].y])
-        pinky_mcp = np.array([lms[17].x, lms[17].y])
-        palm_width = np.linalg.norm(pinky_mcp - index_mcp)
+    def _create_landmarker(self):
+        """Create a Tasks HandLandmarker that delivers results to _on_result"""
+        delegates = [mp.tasks.BaseOptions.Delegate.CPU]
+        if HAND_LANDMARKER_GPU:
+            delegates.insert(0, mp.tasks.BaseOptions.Delegate.GPU)
+
+        for delegate in delegates:
+            options = mp.tasks.vision.HandLandmarkerOptions(
+                base_options=mp.tasks.BaseOptions(model_asset_path=HAND_LANDMARKER_MODEL, delegate=delegate),
+                running_mode=mp.tasks.vision.RunningMode.LIVE_STREAM,
+                num_hands=1,
+                min_hand_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+                result_callback=self._on_result
+            )
+            try:
+                return mp.tasks.vision.HandLandmarker.create_from_options(options)
+            except RuntimeError as e:
+                if delegate == delegates[-1]:
+                    raise
+                print(f"[INFO] GPU delegate unavailable, using CPU: {e}")
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        """HandLandmarker callback (runs on MediaPipe's thread): store the latest hand"""
+        hand_landmarks = None
+        confidence = 0.0
+        if result.hand_landmarks:
+            # Repackage as the Solutions protobuf so the detectors and drawing utils are unchanged
+            hand_landmarks = landmark_pb2.NormalizedLandmarkList()
+            hand_landmarks.landmark.extend(
+                landmark_pb2.NormalizedLandmark(x=lm.x, y=lm.y, z=lm.z)
+                for lm in result.hand_landmarks[0]
+            )
+            confidence = result.handedness[0][0].score if result.handedness else 0.7
+        with self._result_lock:
+            self._latest_result = (hand_landmarks, confidence)
+
+    def _convert_to_rgb(self, img):
+        """Downscale to the inference size and convert BGR -> RGB, on the GPU via OpenCL when enabled"""
+        size = (INFERENCE_WIDTH, INFERENCE_HEIGHT)
+        if self._use_opencl:
+            try:
+                small = cv2.resize(cv2.UMat(img), size, interpolation=cv2.INTER_AREA)
+                return cv2.cvtColor(small, cv2.COLOR_BGR2RGB).get()
+            except cv2.error as e:
+                self._use_opencl = False
+                print(f"[INFO] OpenCL color conversion disabled: {e}")
+        # Resize first so cvtColor only touches a quarter of the pixels
+        self._small_buf = cv2.resize(img, size, dst=self._small_buf, interpolation=cv2.INTER_AREA)
+        self._rgb_buf = cv2.cvtColor(self._small_buf, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        return self._rgb_buf
+
+    def _detect_frame(self):
+        """Capture the newest frame and run hand detection on it
+
+        Returns (frame, hand_landmarks, confidence, landmark_points), or None if no frame was read.
+        """
+        img = self.stream.read()
+        if img is None:
+            return None
 
-        # Also consider the span from thumb to pinky
-        thumb_cmc = np.array([lms[1].x, lms[1].y])
-        pinky_cmc = np.array([lms[17].x, lms[17].y])
-        hand_span = np.linalg.norm(pinky_cmc - thumb_cmc)
+        with self._inference_lock:
+            img_rgb = self._convert_to_rgb(img)
 
-        # Return average of these measurements for more stable scaling
-        return (palm_height + palm_width + hand_span) / 3
+            if self.landmarker:
+                # Submit this frame and use whatever result has arrived most recently
+                timestamp_ms = max(int(time.monotonic() * 1000), self._last_timestamp_ms + 1)
+                self._last_timestamp_ms = timestamp_ms
+                self.landmarker.detect_async(mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb), timestamp_ms)
+                with self._result_lock:
+                    hand_landmarks, confidence = self._latest_result
+            else:
+                results = self.hands.process(img_rgb)
 
-    def get_finger_count(self):
-        """Detect and return the stabilized number of fingers held up (0-5)"""
-        if not self.hand_landmarks:
-            self.finger_count_buffer.append(None)
-            return self._get_stable_finger_count()
+                if results.multi_hand_landmarks and len(results.multi_hand_landmarks) > 0:
+                    hand_landmarks = results.multi_hand_landmarks[0]
+                    if results.multi_handedness:
+                        confidence = results.multi_handedness[0].classification[0].score
+                    else:
+                        confidence = 0.7
+                else:
+                    hand_landmarks = None
+                    confidence = 0.0
+
+        # Copy landmarks out of the protobuf once so detectors work on a plain array
+        if hand_landmarks:
+            landmark_points = np.fromiter(
+                (c for lm in hand_landmarks.landmark for c in (lm.x, lm.y)), dtype=np.float32, count=42
+            ).reshape(21, 2)
+        else:
+            landmark_points = None
 
-        lms = self.hand_landmarks.landmark
-        fingers = []
-
-        # Robust finger detection using vector-based approach
-        # Check if fingertip is extended beyond the middle joint (works with different orientations)
-        finger_indices = [
-            (8, 7, 6, 5),   # Index: tip, DIP, PIP, MCP
-            (12, 11, 10, 9), # Middle: tip, DIP, PIP, MCP
-            (16, 15, 14, 13), # Ring: tip, DIP, PIP, MCP
-            (20, 19, 18, 17)  # Pinky: tip, DIP, PIP, MCP
-        ]
-
-        for tip_idx, dip_idx, pip_idx, mcp_idx in finger_indices:
-            # Calculate vectors from MCP to PIP and PIP to tip
-            mcp_to_pip_x = lms[pip_idx].x - lms[mcp_idx].x
-            mcp_to_pip_y = lms[pip_idx].y - lms[mcp_idx].y
-            pip_to_tip_x = lms[tip_idx].x - lms[pip_idx].x
-            pip_to_tip_y = lms[tip_idx].y - lms[pip_idx].y
-
-            # Calculate the angle between the two vectors
-            dot_product = mcp_to_pip_x * pip_to_tip_x + mcp_to_pip_y * pip_to_tip_y
-            mag1 = math.hypot(mcp_to_pip_x, mcp_to_pip_y)
-            mag2 = math.hypot(pip_to_tip_x, pip_to_tip_y)
-
-            if mag1 > 0 and mag2 > 0:
-                cos_angle = dot_product / (mag1 * mag2)
-                cos_angle = max(-1, min(1, cos_angle))  # Clamp to avoid numerical issues
-                angle = math.acos(cos_angle)
-
-                # Finger is extended if the angle is small (finger is relatively straight)
-                finger_extended = angle < math.pi / 3  # ~60 degrees
-            else:
-                # Fallback to simple distance check if vectors are too small
-                tip_to_pip_dist = math.hypot(pip_to_tip_x, pip_to_tip_y)
-                finger_extended = tip_to_pip_dist > 0.05  # Arbitrary threshold
+        return img, hand_landmarks, confidence, landmark_points
 
-            fingers.append(1 if finger_extended else 0)
+    def start(self):
+        """Run capture and detection on a background thread that feeds process_frame()"""
+        if self._worker is not None:
+            return
+        self._running = True
+        self._worker = threading.Thread(target=self._detection_loop, daemon=True)
+        self._worker.start()
+
+    def _detection_loop(self):
+        """Worker thread: queue each detection, dropping the oldest when the consumer falls behind"""
+        while self._running:
+            result = self._detect_frame()
+            if result is None:
+                time.sleep(0.05)
+            try:
+                self._results.put_nowait(result)
+            except queue.Full:
+                try:
+                    self._results.get_nowait()
+                except queue.Empty:
+                    pass
+                self._results.put_nowait(result)
 
-        total_fingers = sum(fingers)
+    def process_frame(self):
+        """Read and process a single frame, storing results for all detection methods
 
-        # Improved thumb detection - more reliable approach
-        thumb_extended = False
+        Once start() has been called this blocks until the worker delivers the next
+        frame; otherwise the frame is captured and processed inline.
+        """
+        if self._worker is None:
+            result = self._detect_frame()
+        else:
+            try:
+                result = self._results.get(timeout=FRAME_TIMEOUT)
+            except queue.Empty:
+                result = None
 
-        # Method 1: Check if thumb tip is far from thumb base (simplified)
-        thumb_base_to_tip = math.hypot(lms[4].x - lms[2].x, lms[4].y - lms[2].y)
-        hand_scale = self.get_hand_scale()
-        thumb_threshold = hand_scale * 0.6  # More reasonable threshold
+        if result is None:
+            self.current_frame = None
+            self.hand_landmarks = None
+            self.landmark_points = None
+            return False
 
-        # Method 2: Check if thumb tip is positioned away from palm center
-        palm_center_x = (lms[0].x + lms[9].x) / 2
-        palm_center_y = (lms[0].y + lms[9].y) / 2
-        thumb_to_palm_center = math.hypot(lms[4].x - palm_center_x, lms[4].y - palm_center_y)
+        self.current_frame, self.hand_landmarks, self.detection_confidence, self.landmark_points = result
+        self._hand_scale = None
+        return True
 
-        # Method 3: Check relative position to index finger
-        thumb_vs_index = math.hypot(lms[4].x - lms[5].x, lms[4].y - lms[5].y)
+    def get_hand_scale(self):
+        """Calculate hand scale based on palm dimensions for dynamic thresholds"""
+        if self.landmark_points is None:
+            return 0.15
 
-        # Thumb is extended if ANY of these conditions are met (more lenient)
-        if (thumb_base_to_tip > thumb_threshold or
-            thumb_to_palm_center > hand_scale * 0.8 or
-            thumb_vs_index > hand_scale * 0.4):
-            thumb_extended = True
+        # Finger counting, action detection and the overlay all ask for the same frame's scale
+        if self._hand_scale is None:
+            self._hand_scale = float(measure_hand_scale(self.landmark_points))
+        return self._hand_scale
 
-        if thumb_extended:
-            total_fingers += 1
+    def get_finger_count(self):
+        """Detect and return the stabilized number of fingers held up (0-5)"""
+        if self.landmark_points is None:
+            self._add_finger_count(None)
+            return self._get_stable_finger_count()
 
-        self.finger_count_buffer.append(total_fingers)
+        total_fingers = int(count_fingers(self.landmark_points, self.get_hand_scale()))
+        self._add_finger_count(total_fingers)
         return self._get_stable_finger_count()
+
+    def _clear_finger_counts(self):
+        """Empty finger_count_buffer and the running tallies kept alongside it"""
+        self.finger_count_buffer.clear()
+        self.finger_count_tally = [0] * 6  # occurrences of each count (0-5) in the buffer
+        self.valid_finger_frames = 0       # buffer entries that are not None
+        self.finger_count_run = 0          # identical valid counts in a row, ignoring no-hand frames
+        self.last_valid_finger_count = None
+
+    def _add_finger_count(self, count):
+        """Append to finger_count_buffer, updating the tallies as values enter and leave"""
+        buffer = self.finger_count_buffer
+        if len(buffer) == buffer.maxlen:
+            evicted = buffer[0]
+            if evicted is not None:
+                self.valid_finger_frames -= 1
+                self.finger_count_tally[evicted] -= 1
+        buffer.append(count)
+        if count is not None:
+            self.valid_finger_frames += 1
+            self.finger_count_tally[count] += 1
+            if count == self.last_valid_finger_count:
+                self.finger_count_run += 1
+            else:
+                self.finger_count_run = 1
+            self.last_valid_finger_count = count
     
     def _get_stable_finger_count(self):
         """Get stabilized finger count from buffer with different timing requirements"""
-        valid_counts = [c for c in self.finger_count_buffer if c is not None]
-        if not valid_counts:
-            return None
-        
-        # Get the most recent stable count for analysis
-        count_freq = Counter(valid_counts)
-        most_common = count_freq.most_common(1)[0]
-        detected_count = most_common[0]
-
         # Same stability requirements for all finger counts (0.5 seconds)
         stability_window = 10  # 0.5 seconds at 20 FPS
         max_stable_frames = 10
         min_frames_required = 8  # Require at least 8 valid frames
 
-        if len(valid_counts) < min_frames_required:
+        if self.valid_finger_frames < min_frames_required:
             return None
 
-        # Check if recent frames are consistent
-        recent_counts = valid_counts[-stability_window:]
-        if len(set(recent_counts)) == 1 and len(recent_counts) >= stability_window:
+        # Most frequent count in the buffer; ties go to the count seen first, as with Counter.most_common
+        tally = self.finger_count_tally
+        best = max(tally)
+        if tally.count(best) == 1:
+            detected_count = tally.index(best)
+        else:
+            detected_count = next(c for c in self.finger_count_buffer if c is not None and tally[c] == best)
+
+        # Check if recent frames are consistent: the last stability_window valid counts are all
+        # the same exactly when the current run is that long and the buffer holds that many
+        if self.finger_count_run >= stability_window and self.valid_finger_frames >= stability_window:
             self.finger_count_stable_frames = min(self.finger_count_stable_frames + 1, max_stable_frames)
         else:
             self.finger_count_stable_frames = 0
@@ -216,77 +586,29 @@ class GestureRecognizer:
     
     def get_action_gesture(self):
         """Detect action gestures with fixed logic order"""
-        if not self.hand_landmarks:
-            self.action_buffer.append(None)
-            return self._get_most_common_gesture()
-        
-        lms = self.hand_landmarks.landmark
-        
-        fingers = []
-        fingers.append(1 if lms[8].y < lms[7].y else 0)   # Index
-        fingers.append(1 if lms[12].y < lms[11].y else 0) # Middle
-        fingers.append(1 if lms[16].y < lms[15].y else 0) # Ring
-        fingers.append(1 if lms[20].y < lms[19].y else 0) # Pinky
-        
-        total_fingers = sum(fingers)
-        
-        hand_scale = self.get_hand_scale()
-        thumb_threshold = hand_scale * 1.3
-        
-        thumb_extended = False
-        thumb_distance = math.hypot(lms[4].x - lms[17].x, lms[4].y - lms[17].y)
-        if thumb_distance > thumb_threshold:
-            thumb_extended = True
-        
-        detected_gesture = None
-        
-        # Check in correct order
-        if total_fingers == 4 and thumb_extended:
-            detected_gesture = "OPEN_HAND"
-        elif total_fingers == 1 and fingers[0] == 1 and not thumb_extended:
-            # Only index finger is up
-            index_tip = lms[8]
-            index_mcp = lms[5]
-            wrist = lms[0]
-            
-            tip_to_mcp_x = index_tip.x - index_mcp.x
-            tip_to_wrist_x = index_tip.x - wrist.x
-            avg_delta_x = (tip_to_mcp_x * 0.6 + tip_to_wrist_x * 0.4)
-            
-            point_threshold = hand_scale * 0.2
-            
-            if avg_delta_x > point_threshold:
-                detected_gesture = "POINT_RIGHT"
-            elif avg_delta_x < -point_threshold:
-                detected_gesture = "POINT_LEFT"
-            else:
-                detected_gesture = "POINT_RIGHT"
-        elif total_fingers == 0:
-            detected_gesture = "FIST"
-        
-        self.action_buffer.append(detected_gesture)
-        return self._get_most_common_gesture()
-    
-    def _get_most_common_gesture(self):
-        """Get the most common gesture from the buffer"""
-        valid_gestures = [g for g in self.action_buffer if g is not None]
-        if not valid_gestures:
-            return None
-        
-        gesture_counts = Counter(valid_gestures)
-        most_common = gesture_counts.most_common(1)
-        
-        if most_common:
-            return most_common[0][0]
-        return None
+        if self.landmark_points is None:
+            code = 0
+        else:
+            code = classify_action(self.landmark_points, self.get_hand_scale())
+
+        # A single-frame flicker never reaches ACTION_CONFIRM_FRAMES, so it can't fire a command
+        self.action_history = ((self.action_history << ACTION_CODE_BITS) | code) & ACTION_HISTORY_MASK
+        return ACTION_GESTURES[ACTION_VOTES[self.action_history]]
 
     def draw_debug_overlay(self, mode_phase, locked_mode, detected_fingers, detected_action):
         """Draw debug information on the frame"""
         if self.current_frame is None or not self.debug_enabled:
             return
+
+        # Rendering and waitKey cost several ms on a Pi; there's no point redrawing faster than the eye
+        now = time.monotonic()
+        if now - self._last_overlay_time < OVERLAY_MIN_INTERVAL:
+            return
+        self._last_overlay_time = now
         
         try:
-            img = self.current_frame.copy()
+            # Each captured frame is a fresh array that only this thread still uses, so draw on it directly
+            img = self.current_frame
             
             if self.hand_landmarks:
                 self.mp_draw.draw_landmarks(img, self.hand_landmarks, 
@@ -341,31 +663,46 @@ class GestureRecognizer:
         print("[CAMERA] Resetting camera state...")
 
         # Clear all detection buffers and state
-        self.finger_count_buffer.clear()
-        self.action_buffer.clear()
+        self._clear_finger_counts()
+        self.action_history = 0
         self.finger_count_stable_frames = 0
         self.current_frame = None
         self.hand_landmarks = None
-        self.last_gesture = None
+        self.landmark_points = None
         self.detection_confidence = 0.0
 
         # Reinitialize MediaPipe hands for fresh detection
         try:
-            self.hands.close()
-            self.hands = self.mp_hands.Hands(
-                static_image_mode=False,
-                max_num_hands=1,
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.3
-            )
+            with self._inference_lock:
+                if self.landmarker:
+                    self.landmarker.close()
+                    with self._result_lock:
+                        self._latest_result = (None, 0.0)
+                    self.landmarker = self._create_landmarker()
+                else:
+                    self.hands.close()
+                    self.hands = self._create_hands()
             print("[CAMERA] MediaPipe hands reinitialized")
         except Exception as e:
             print(f"[WARN] Could not reinitialize MediaPipe: {e}")
 
+        # Drop detections queued before the reset
+        while not self._results.empty():
+            try:
+                self._results.get_nowait()
+            except queue.Empty:
+                break
+
         print("[CAMERA] Reset complete")
 
     def close(self):
-        self.cap.release()
+        self._running = False
+        if self._worker is not None:
+            self._worker.join(timeout=FRAME_TIMEOUT)
+            self._worker = None
+        if self.landmarker:
+            self.landmarker.close()
+        self.stream.stop()
         if self.debug_enabled:
             try:
                 cv2.destroyAllWindows()
@@ -376,56 +713,37 @@ class GestureRecognizer:
 class ModeDetector:
     """Simple mode detector - maps finger count to mode"""
     
-    MODE_MAP = {
-        1: "TEMPERATURE",
-        2: "LIGHTS", 
-        3: "BLINDS",
-        4: "DOOR"
-    }
+    # Indexed by finger count (0-5); only 1-4 select a mode
+    MODE_MAP = (None, "TEMPERATURE", "LIGHTS", "BLINDS", "DOOR", None)
     
     def finger_count_to_mode(self, finger_count):
         """Convert finger count (1-4) to mode name"""
-        return self.MODE_MAP.get(finger_count)
+        if finger_count is None:
+            return None
+        return self.MODE_MAP[finger_count]
 
 
 class CommandMapper:
     """Maps mode + action to MQTT command"""
     
+    COMMAND_MAP = {
+        ("TEMPERATURE", "OPEN_HAND"): ("TEMPERATURE", "AC_ON"),
+        ("TEMPERATURE", "FIST"): ("TEMPERATURE", "AC_OFF"),
+        ("TEMPERATURE", "POINT_RIGHT"): ("TEMPERATURE", "UP"),
+        ("TEMPERATURE", "POINT_LEFT"): ("TEMPERATURE", "DOWN"),
+        ("LIGHTS", "OPEN_HAND"): ("LIGHTS", "ON"),
+        ("LIGHTS", "FIST"): ("LIGHTS", "OFF"),
+        ("LIGHTS", "POINT_RIGHT"): ("LIGHTS", "BRIGHT"),
+        ("LIGHTS", "POINT_LEFT"): ("LIGHTS", "DIM"),
+        ("BLINDS", "OPEN_HAND"): ("BLINDS", "OPEN"),
+        ("BLINDS", "FIST"): ("BLINDS", "CLOSE"),
+        ("DOOR", "OPEN_HAND"): ("DOOR", "UNLOCK"),
+        ("DOOR", "FIST"): ("DOOR", "LOCK"),
+    }
+    
     def map_to_command(self, mode, action):
         """Map mode and action to command value"""
-        if mode == "TEMPERATURE":
-            if action == "OPEN_HAND":
-                return ("TEMPERATURE", "AC_ON")
-            elif action == "FIST":
-                return ("TEMPERATURE", "AC_OFF")
-            elif action == "POINT_RIGHT":
-                return ("TEMPERATURE", "UP")
-            elif action == "POINT_LEFT":
-                return ("TEMPERATURE", "DOWN")
-        
-        elif mode == "LIGHTS":
-            if action == "OPEN_HAND":
-                return ("LIGHTS", "ON")
-            elif action == "FIST":
-                return ("LIGHTS", "OFF")
-            elif action == "POINT_RIGHT":
-                return ("LIGHTS", "BRIGHT")
-            elif action == "POINT_LEFT":
-                return ("LIGHTS", "DIM")
-        
-        elif mode == "BLINDS":
-            if action == "OPEN_HAND":
-                return ("BLINDS", "OPEN")
-            elif action == "FIST":
-                return ("BLINDS", "CLOSE")
-        
-        elif mode == "DOOR":
-            if action == "OPEN_HAND":
-                return ("DOOR", "UNLOCK")
-            elif action == "FIST":
-                return ("DOOR", "LOCK")
-        
-        return (None, None)
+        return self.COMMAND_MAP.get((mode, action), (None, None))
 
 
 class GestureMQTTPublisher:
@@ -435,12 +753,15 @@ class GestureMQTTPublisher:
         self.mqtt_client = None
         self.last_telemetry_time = 0
         self.telemetry_interval = 0.1
+        self._command_prefixes = {}  # (category, action, value) -> encoded JSON without timestamp
+        self.connected = threading.Event()
         
     def on_connect(self, client, userdata, flags, rc):
         """MQTT connection callback"""
         if rc == 0:
             print(f'[OK] MQTT connected to {MQTTConfig.BROKER}:{MQTTConfig.PORT}')
             print(f'[OK] Publishing to {MQTTConfig.TOPIC}')
+            self.connected.set()
         else:
             print(f'[FAIL] MQTT connection failed: {rc}')
     
@@ -451,7 +772,7 @@ class GestureMQTTPublisher:
     def setup_mqtt(self):
         """Setup and connect MQTT client"""
         try:
-            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-gesture-{str(uuid.uuid1())}"
+            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-gesture-{os.getpid()}-{time.monotonic_ns()}"
             self.mqtt_client = mqtt.Client(client_id)
             
             if MQTTConfig.USERNAME and MQTTConfig.PASSWORD:
@@ -463,22 +784,33 @@ class GestureMQTTPublisher:
             self.mqtt_client.connect(MQTTConfig.BROKER, port=MQTTConfig.PORT, keepalive=MQTTConfig.KEEPALIVE)
             self.mqtt_client.loop_start()
             
-            time.sleep(1)
+            # Continue as soon as the CONNACK arrives instead of after a fixed delay
+            if not self.connected.wait(MQTT_CONNECT_TIMEOUT):
+                print('[WARN] MQTT not connected yet; paho will keep retrying in the background')
             return True
         except Exception as e:
             print(f'[WARN] MQTT setup failed: {e}')
             return False
     
+    def _encode_command(self, category, action, value, timestamp):
+        """Encode a command payload, serializing the fixed fields once per distinct command"""
+        key = (category, action, value)
+        prefix = self._command_prefixes.get(key)
+        if prefix is None:
+            fixed = {'type': 'gesture_command', 'category': category, 'action': action, 'value': value}
+            prefix = encode_json(fixed)[:-1] + b', "timestamp": '
+            self._command_prefixes[key] = prefix
+        return prefix + encode_json(timestamp) + b'}'
+
     def publish_command(self, command_data):
         """Publish gesture command to MQTT"""
-        payload = {
-            'type': 'gesture_command',
-            'category': command_data.get('category'),
-            'action': command_data.get('action'),
-            'value': command_data.get('value'),
-            'timestamp': command_data.get('timestamp')
-        }
-        result = self.mqtt_client.publish(MQTTConfig.TOPIC, json.dumps(payload))
+        payload = self._encode_command(
+            command_data.get('category'),
+            command_data.get('action'),
+            command_data.get('value'),
+            command_data.get('timestamp')
+        )
+        result = self.mqtt_client.publish(MQTTConfig.TOPIC, payload)
         
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
             print(f"[{command_data.get('timestamp')}] COMMAND: {command_data.get('category')} -> {command_data.get('action')} = {command_data.get('value')}")
@@ -487,9 +819,13 @@ class GestureMQTTPublisher:
             print(f"[ERROR] Failed to publish command: rc={result.rc}")
             return False
     
+    def telemetry_due(self):
+        """True once telemetry_interval has passed since the last telemetry publish"""
+        return time.monotonic() - self.last_telemetry_time >= self.telemetry_interval
+
     def publish_telemetry(self, telemetry_data):
         """Publish gesture telemetry to MQTT"""
-        current_time = time.time()
+        current_time = time.monotonic()
         if current_time - self.last_telemetry_time < self.telemetry_interval:
             return False
         
@@ -505,7 +841,7 @@ class GestureMQTTPublisher:
             'timestamp': telemetry_data.get('timestamp')
         }
         
-        result = self.mqtt_client.publish(MQTTConfig.TOPIC, json.dumps(payload))
+        result = self.mqtt_client.publish(MQTTConfig.TOPIC, encode_json(payload))
         return result.rc == mqtt.MQTT_ERR_SUCCESS
     
     def cleanup(self):
@@ -559,42 +895,42 @@ def main():
     mode_lock_time = 0
     action_cooldown = 0.5
     mode_timeout = 5.0
+    debug_counter = -1  # so the first frame prints a status line
 
     # Stability requirements for mode locking based on finger count
     def get_stability_requirement(finger_count):
         """Get required stable frames for mode locking - same for all finger counts"""
         return 8  # All fingers require ~0.4 seconds of stability
     
-    # Main loop
+    # Main loop, paced by the detection thread rather than a fixed sleep
+    recognizer.start()
     try:
         while True:
             if not recognizer.process_frame():
-                time.sleep(0.05)
                 continue
+            # One monotonic timestamp per frame: immune to wall-clock jumps in cooldown/timeout math
+            current_time = time.monotonic()
             
             finger_count = recognizer.get_finger_count()
             action_gesture = recognizer.get_action_gesture()
 
             # Debug: Print detection status every few frames
-            if hasattr(recognizer, '_debug_counter'):
-                recognizer._debug_counter = (recognizer._debug_counter + 1) % 30  # Every ~1.5 seconds at 20 FPS
-            else:
-                recognizer._debug_counter = 0
-
-            if recognizer._debug_counter == 0:
+            debug_counter = (debug_counter + 1) % DEBUG_STATUS_FRAMES
+            if debug_counter == 0:
                 hand_status = "DETECTED" if recognizer.hand_landmarks else "NOT DETECTED"
                 print(f"[DEBUG] Hand {hand_status} | Fingers: {finger_count} | Confidence: {recognizer.detection_confidence:.2f}")
             
-            # Send telemetry
-            telemetry = {
-                'mode_phase': mode_phase,
-                'locked_mode': locked_mode,
-                'finger_count': finger_count,
-                'action_gesture': action_gesture if mode_phase == "LOCKED_MODE" else None,
-                'confidence': recognizer.detection_confidence,
-                'timestamp': time.strftime('%H:%M:%S')
-            }
-            mqtt_publisher.publish_telemetry(telemetry)
+            # Send telemetry; it is throttled, so only build the payload on frames that will publish
+            if mqtt_publisher.telemetry_due():
+                telemetry = {
+                    'mode_phase': mode_phase,
+                    'locked_mode': locked_mode,
+                    'finger_count': finger_count,
+                    'action_gesture': action_gesture if mode_phase == "LOCKED_MODE" else None,
+                    'confidence': recognizer.detection_confidence,
+                    'timestamp': now_str()
+                }
+                mqtt_publisher.publish_telemetry(telemetry)
             
             # Draw debug overlay (will skip if no display)
             recognizer.draw_debug_overlay(
@@ -615,7 +951,7 @@ def main():
                                 mode = mode_detector.finger_count_to_mode(finger_count)
                                 mode_phase = "LOCKED_MODE"
                                 locked_mode = mode
-                                mode_lock_time = time.time()
+                                mode_lock_time = current_time
                                 print(f"\n[MODE LOCKED] {mode}")
                                 print("[READY] Waiting for action gesture...")
                                 mode_lock_frames = 0
@@ -627,8 +963,6 @@ def main():
                         last_finger_count = None
                         
             elif mode_phase == "LOCKED_MODE":
-                current_time = time.time()
-                
                 if (current_time - mode_lock_time) >= mode_timeout:
                     print(f"\n[TIMEOUT] Resetting to mode selection...")
                     mode_phase = "SELECT_MODE"
@@ -654,7 +988,7 @@ def main():
                                 "category": locked_mode,
                                 "action": cmd_action,
                                 "value": cmd_value,
-                                "timestamp": time.strftime('%H:%M:%S')
+                                "timestamp": now_str()
                             }
                             
                             if mqtt_publisher.publish_command(command_data):
@@ -669,8 +1003,6 @@ def main():
                     if last_action is not None:
                         last_action = None
             
-            time.sleep(0.05)
-            
     except KeyboardInterrupt:
         print("\n\nStopping...")
     finally:
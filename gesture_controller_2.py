@@ -9,11 +9,12 @@ smoothing. Keeps existing MQTT payload shape and default topic so downstream
 import cv2
 import time
 import json
+import os
 import sys
-import math
-import uuid
+import threading
 from collections import deque, Counter
 
+import numpy as np
 import paho.mqtt.client as mqtt
 from mqtt.config import MQTTConfig
 
@@ -36,17 +37,44 @@ except ImportError:
     print("Error: MediaPipe is required but not installed. Exiting.")
     sys.exit(1)
 
-# --- Tunable constants (grouped for quick tweaking) ---
-CAMERA_WIDTH = 640
-CAMERA_HEIGHT = 480
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit: leave the function as plain Python"""
+        return lambda func: func
+
+# orjson is optional; it serializes straight to bytes, which paho publishes as-is
+try:
+    from orjson import dumps as encode_json
+except ImportError:
+    def encode_json(obj):
+        return json.dumps(obj).encode()
 
-# Detection confidence
+# --- Tunable constants (grouped for quick tweaking) ---
+# Palm detection downsamples to 192x192 internally and all landmark math is in
+# normalized coordinates, so a smaller capture only saves bandwidth and cvtColor work
+CAMERA_WIDTH = 320
+CAMERA_HEIGHT = 240
+FRAME_TIMEOUT = 1.0             # seconds to wait for the capture thread before giving up
+
+# Detection confidence. Tracking reuses the previous landmarks as the next ROI and
+# only re-runs the palm detector when tracking confidence drops below the threshold.
 MIN_DETECTION_CONFIDENCE = 0.72
-MIN_TRACKING_CONFIDENCE = 0.65
+MIN_TRACKING_CONFIDENCE = 0.5
+MODEL_COMPLEXITY = 0          # lite landmark model; plenty for coarse finger/pose tests
+
+# Optional MediaPipe Tasks backend: path to a `hand_landmarker.task` bundle. When set,
+# HandLandmarker runs in LIVE_STREAM mode and results arrive on its own thread.
+HAND_LANDMARKER_MODEL = os.environ.get("HAND_LANDMARKER_MODEL", "")
+HAND_LANDMARKER_GPU = os.environ.get("HAND_LANDMARKER_GPU") == "1"  # GPU delegate where supported
 
 # Mode selection
-MODE_HOLD_FRAMES = 5          # consecutive stable frames to lock a mode
-MODE_BUFFER_SIZE = 12         # smoothing window for finger counts
+MODE_STREAK_MIN = 3           # consecutive identical finger counts before a count is reported
+MODE_HOLD_FRAMES = 5          # consecutive identical finger counts to lock a mode
 MODE_TIMEOUT = 5.0            # seconds before returning to selection
 MODE_EXIT_PINCH_HOLD = 1.0    # seconds pinch must be held to exit mode
 
@@ -65,9 +93,58 @@ FINGER_TIP_ABOVE_DELTA = -0.06
 # Stricter thumb extension to prevent phantom counts
 THUMB_EXTENDED_X_MIN = 0.035
 THUMB_INDEX_BASE_DIST = 0.08
-
-# Frame pacing
-FRAME_SLEEP = 0.05
+# Squared forms of the distance thresholds, so the tests can skip the sqrt
+THUMB_INDEX_PINCH_DIST_SQ = THUMB_INDEX_PINCH_DIST ** 2
+THUMB_INDEX_BASE_DIST_SQ = THUMB_INDEX_BASE_DIST ** 2
+# Tip and PIP landmarks for index, middle, ring and pinky
+FINGER_TIPS = np.array([8, 12, 16, 20])
+FINGER_PIPS = np.array([6, 10, 14, 18])
+FINGER_BITS = np.array([0b1000, 0b0100, 0b0010, 0b0001])
+
+# Action for each finger state (bits: thumb, index, middle, ring, pinky); unlisted
+# states are not an action. POINT is resolved to LEFT/RIGHT from the index direction.
+STATE_GESTURES = {
+    0b10000: "MODE_SWITCH",  # thumb only (avoids 2-finger conflict with lights)
+    0b11111: "OPEN_HAND",    # thumb plus at least three fingers
+    0b10111: "OPEN_HAND",
+    0b11011: "OPEN_HAND",
+    0b11101: "OPEN_HAND",
+    0b11110: "OPEN_HAND",
+    0b01000: "POINT",        # index only
+    0b00000: "FIST",
+    0b00100: "FIST",         # a single stray middle/ring/pinky still reads as a fist
+    0b00010: "FIST",
+    0b00001: "FIST",
+}
+
+# Frame pacing: the main loop runs once per camera frame (FrameGrabber.get() waits for it)
+FRAME_SLEEP = 0.05            # retry delay after a failed camera read
+DISPLAY_MIN_INTERVAL = 0.1    # seconds between OLED pushes (10 Hz max)
+
+# MQTT
+MQTT_CONNECT_TIMEOUT = 5.0    # max seconds setup_mqtt() waits for the broker's CONNACK
+
+
+@njit(cache=True)
+def finger_state(pts):
+    """Return (finger count, 5-bit finger state) for (21, 2) landmark points.
+
+    State bits are thumb, index, middle, ring, pinky (see STATE_GESTURES).
+    """
+    # Index, middle, ring, pinky: tip far enough above its PIP
+    state = 0
+    count = 0
+    for i in range(4):
+        if pts[FINGER_TIPS[i], 1] - pts[FINGER_PIPS[i], 1] < FINGER_TIP_ABOVE_DELTA:
+            state |= FINGER_BITS[i]
+            count += 1
+
+    # Thumb: compare its tip to the index MCP along x for direction robustness
+    dx, dy = pts[4, 0] - pts[5, 0], pts[4, 1] - pts[5, 1]
+    if abs(pts[4, 0] - pts[3, 0]) > THUMB_EXTENDED_X_MIN and dx * dx + dy * dy > THUMB_INDEX_BASE_DIST_SQ:
+        state |= 0b10000
+        count += 1
+    return count, state
 
 
 class DisplayManager:
@@ -78,6 +155,8 @@ class DisplayManager:
         self.width = 0
         self.height = 0
         self.last_lines = ()
+        self.pending_lines = None  # newest text not yet pushed because of the rate limit
+        self.last_push = 0.0
 
         if not DISPLAY_LIBS_AVAILABLE:
             return
@@ -93,6 +172,9 @@ class DisplayManager:
                 self.font = ImageFont.truetype("DejaVuSans.ttf", 12)
             except Exception:
                 self.font = ImageFont.load_default()
+            # Fixed for the life of the display, so measure once instead of per redraw
+            self.line_height = self.font.getbbox("A")[3] if hasattr(self.font, "getbbox") else self.font.getsize("A")[1]
+            self.clear_box = (0, 0, self.width, self.height)
             self.available = True
             self.clear()
             print("[OK] SSD1306 display initialized")
@@ -106,20 +188,36 @@ class DisplayManager:
         self.display.fill(0)
         self.display.show()
         self.last_lines = ()
+        self.pending_lines = None
 
     def show_lines(self, lines):
         if not self.available:
             return
         norm = tuple(str(line)[:18] for line in lines[:2])
+        shown = self.pending_lines if self.pending_lines is not None else self.last_lines
+        if norm == shown:
+            return
+        self.pending_lines = norm
+        self.flush()
+
+    def flush(self):
+        """Push pending text unless the display was updated less than DISPLAY_MIN_INTERVAL ago."""
+        if not self.available or self.pending_lines is None:
+            return
+        now = time.monotonic()
+        if now - self.last_push < DISPLAY_MIN_INTERVAL:
+            return
+        norm = self.pending_lines
+        self.pending_lines = None
         if norm == self.last_lines:
             return
+        self.last_push = now
         self.last_lines = norm
-        self.draw.rectangle((0, 0, self.width, self.height), outline=0, fill=0)
+        self.draw.rectangle(self.clear_box, outline=0, fill=0)
         y = 0
-        line_height = self.font.getbbox("A")[3] if hasattr(self.font, "getbbox") else self.font.getsize("A")[1]
         for line in norm:
             self.draw.text((0, y), line, font=self.font, fill=255)
-            y += line_height
+            y += self.line_height
         self.display.image(self.image)
         self.display.show()
 
@@ -142,22 +240,87 @@ class DisplayManager:
         self.show_lines(["Mode timeout", "Select 1-4 fingers"])
 
 
+class FrameGrabber:
+    """Reads the camera on a daemon thread, keeping only the newest frame.
+
+    Capture latency overlaps with MediaPipe inference on the main thread, and
+    frames the main loop is too slow for are overwritten instead of queueing up.
+    """
+
+    def __init__(self, src=0):
+        self.cap = cv2.VideoCapture(src)
+        if not self.cap.isOpened():
+            raise IOError("Cannot open webcam. Ensure camera module is connected and enabled.")
+
+        self.cap.set(3, CAMERA_WIDTH)
+        self.cap.set(4, CAMERA_HEIGHT)
+        # MJPG decodes faster than raw YUYV, and a 1-frame driver queue keeps frames fresh
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.latest_frame = None
+        self.frame_id = 0   # bumped for every captured frame
+        self.read_id = 0    # frame_id last handed out by get()
+        self.lock = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(FRAME_SLEEP)
+                continue
+            with self.lock:
+                self.latest_frame = frame
+                self.frame_id += 1
+                self.lock.notify()
+
+    def get(self, timeout=FRAME_TIMEOUT):
+        """Return the newest frame not returned before, waiting for one if needed (None on timeout)."""
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.frame_id != self.read_id, timeout):
+                return None
+            self.read_id = self.frame_id
+            return self.latest_frame
+
+    def release(self):
+        self.running = False
+        self.thread.join(timeout=FRAME_TIMEOUT)
+        self.cap.release()
+
+
 class RollingValue:
-    """Utility for temporal smoothing."""
+    """Utility for temporal smoothing.
+
+    Counts of the non-None values in the window are kept up to date as values
+    enter and leave, so stable_value() doesn't re-count the buffer every tick.
+    """
 
     def __init__(self, maxlen):
         self.buffer = deque(maxlen=maxlen)
+        self.counts = Counter()
+        self.valid = 0
 
     def add(self, value):
+        if len(self.buffer) == self.buffer.maxlen:
+            evicted = self.buffer[0]
+            if evicted is not None:
+                self.valid -= 1
+                self.counts[evicted] -= 1
+                if not self.counts[evicted]:
+                    del self.counts[evicted]
         self.buffer.append(value)
+        if value is not None:
+            self.valid += 1
+            self.counts[value] += 1
 
     def stable_value(self, min_samples=3, min_fraction=0.6):
-        values = [v for v in self.buffer if v is not None]
-        if len(values) < min_samples:
+        if self.valid < min_samples:
             return None
-        counts = Counter(values)
-        val, freq = counts.most_common(1)[0]
-        if freq / len(values) >= min_fraction:
+        val, freq = self.counts.most_common(1)[0]
+        if freq / self.valid >= min_fraction:
             return val
         return None
 
@@ -165,184 +328,196 @@ class RollingValue:
 class GestureRecognizer:
     def __init__(self):
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=1,
-            min_detection_confidence=MIN_DETECTION_CONFIDENCE,
-            min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
-        )
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            raise IOError("Cannot open webcam. Ensure camera module is connected and enabled.")
-
-        self.cap.set(3, CAMERA_WIDTH)
-        self.cap.set(4, CAMERA_HEIGHT)
+        self.hands = None
+        self.landmarker = None
+        self.result_lock = threading.Lock()
+        self.latest_landmarks = None  # newest HandLandmarker result, set from its callback
+        self.last_timestamp_ms = 0
+        if HAND_LANDMARKER_MODEL:
+            self.landmarker = self._create_landmarker()
+        else:
+            self.hands = self.mp_hands.Hands(
+                static_image_mode=False,
+                max_num_hands=1,
+                model_complexity=MODEL_COMPLEXITY,
+                min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+            )
+        self.grabber = FrameGrabber(0)
+        # Reused RGB input for MediaPipe; cvtColor writes into it instead of allocating per frame
+        self._rgb = np.empty((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
+        self._small = np.empty((CAMERA_HEIGHT, CAMERA_WIDTH, 3), dtype=np.uint8)
 
-        self.mode_buffer = RollingValue(MODE_BUFFER_SIZE)
         self.action_buffer = RollingValue(ACTION_BUFFER_SIZE)
+        # MediaPipe's tracking already smooths landmarks between frames, so finger counts
+        # only need a streak of identical readings rather than a voting window
+        self.finger_count = None  # raw count from the latest frame
+        self.mode_streak = 0      # consecutive frames that produced finger_count
+        # Compile (or load from cache) the numba kernel now rather than on the first detected hand
+        finger_state(np.zeros((21, 2), dtype=np.float64))
 
     def close(self):
-        self.cap.release()
-        cv2.destroyAllWindows()
+        if self.landmarker:
+            self.landmarker.close()
+        self.grabber.release()
+
+    def _create_landmarker(self):
+        delegates = [mp.tasks.BaseOptions.Delegate.CPU]
+        if HAND_LANDMARKER_GPU:
+            delegates.insert(0, mp.tasks.BaseOptions.Delegate.GPU)
+
+        for delegate in delegates:
+            options = mp.tasks.vision.HandLandmarkerOptions(
+                base_options=mp.tasks.BaseOptions(model_asset_path=HAND_LANDMARKER_MODEL, delegate=delegate),
+                running_mode=mp.tasks.vision.RunningMode.LIVE_STREAM,
+                num_hands=1,
+                min_hand_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+                result_callback=self._on_result,
+            )
+            try:
+                return mp.tasks.vision.HandLandmarker.create_from_options(options)
+            except RuntimeError as e:
+                # No GL/OpenCL context on this machine; the CPU delegate always works
+                if delegate == delegates[-1]:
+                    raise
+                print(f"[INFO] GPU delegate unavailable, using CPU: {e}")
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        # Runs on MediaPipe's thread; keep only the newest hand
+        landmarks = result.hand_landmarks[0] if result.hand_landmarks else None
+        with self.result_lock:
+            self.latest_landmarks = landmarks
 
     def _read_frame_landmarks(self):
-        success, frame = self.cap.read()
-        if not success:
+        """Return (frame, landmarks) where landmarks is a sequence of 21 points with .x/.y, or None."""
+        frame = self.grabber.get()
+        if frame is None:
             return None, None
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        small = frame
+        if frame.shape[1] > CAMERA_WIDTH:
+            # The driver ignored the requested size; shrink before converting so inference stays at 320x240
+            small = self._small = cv2.resize(frame, (CAMERA_WIDTH, CAMERA_HEIGHT), dst=self._small,
+                                             interpolation=cv2.INTER_AREA)
+        img_rgb = self._rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+        if self.landmarker:
+            # Submit without waiting and use whichever result has arrived most recently
+            timestamp_ms = max(int(time.monotonic() * 1000), self.last_timestamp_ms + 1)
+            self.last_timestamp_ms = timestamp_ms
+            self.landmarker.detect_async(mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb), timestamp_ms)
+            with self.result_lock:
+                return frame, self.latest_landmarks
+
         results = self.hands.process(img_rgb)
         if not results.multi_hand_landmarks:
             return frame, None
-        return frame, results.multi_hand_landmarks[0]
+        return frame, results.multi_hand_landmarks[0].landmark
 
-    # --- Finger utilities ---
-    def _finger_is_up(self, lms, tip_idx, pip_idx):
-        return lms[tip_idx].y - lms[pip_idx].y < FINGER_TIP_ABOVE_DELTA
+    def analyze_frame(self):
+        """Read one frame, run MediaPipe once and feed both the mode and action buffers.
 
-    def _thumb_is_extended(self, lms):
-        # Compare thumb tip to index MCP along x for direction robustness
-        return (
-            abs(lms[4].x - lms[3].x) > THUMB_EXTENDED_X_MIN
-            and math.hypot(lms[4].x - lms[5].x, lms[4].y - lms[5].y) > THUMB_INDEX_BASE_DIST
-        )
+        Returns False if no frame could be read.
+        """
+        frame, landmarks = self._read_frame_landmarks()
+        if landmarks is None:
+            self.finger_count = None
+            self.mode_streak = 0
+            self.action_buffer.add(None)
+            return frame is not None
+
+        # Copy the landmarks out of the protobuf once; float64 keeps the threshold math exact
+        pts = np.fromiter(
+            (c for lm in landmarks for c in (lm.x, lm.y)), dtype=np.float64, count=42
+        ).reshape(21, 2)
+
+        total, state = finger_state(pts)
+
+        if total == self.finger_count:
+            self.mode_streak += 1
+        else:
+            self.finger_count = total
+            self.mode_streak = 1
+        self.action_buffer.add(self._classify_action(pts, state))
+        return True
 
     def get_finger_count(self):
-        _, hand_lms = self._read_frame_landmarks()
-        if hand_lms is None:
-            self.mode_buffer.add(None)
+        """Finger count once it has held for MODE_STREAK_MIN frames, else None"""
+        if self.mode_streak < MODE_STREAK_MIN:
             return None
+        return self.finger_count
 
-        lms = hand_lms.landmark
-        fingers = [
-            self._finger_is_up(lms, 8, 6),   # index
-            self._finger_is_up(lms, 12, 10), # middle
-            self._finger_is_up(lms, 16, 14), # ring
-            self._finger_is_up(lms, 20, 18), # pinky
-        ]
-        total = sum(1 for f in fingers if f)
-        if self._thumb_is_extended(lms):
-            total += 1
-
-        self.mode_buffer.add(total)
-        return self.mode_buffer.stable_value(min_samples=3, min_fraction=0.55)
+    def reset_mode_streak(self):
+        """Require a fresh streak before the next mode lock"""
+        self.mode_streak = 0
 
-    def _detect_pinch(self, lms):
-        dist = math.hypot(lms[4].x - lms[8].x, lms[4].y - lms[8].y)
-        return dist < THUMB_INDEX_PINCH_DIST
+    def _detect_pinch(self, pts):
+        dx, dy = pts[4, 0] - pts[8, 0], pts[4, 1] - pts[8, 1]
+        return dx * dx + dy * dy < THUMB_INDEX_PINCH_DIST_SQ
 
     def get_action_gesture(self):
-        _, hand_lms = self._read_frame_landmarks()
-        if hand_lms is None:
-            self.action_buffer.add(None)
-            return self.action_buffer.stable_value(ACTION_STABLE_MIN, ACTION_STABLE_FRACTION)
+        """Smoothed action gesture from the frames seen by analyze_frame()"""
+        return self.action_buffer.stable_value(ACTION_STABLE_MIN, ACTION_STABLE_FRACTION)
 
-        lms = hand_lms.landmark
-        thumb_extended = self._thumb_is_extended(lms)
+    def _classify_action(self, pts, state):
+        if self._detect_pinch(pts):
+            return "PINCH"
 
-        finger_up = {
-            "index": self._finger_is_up(lms, 8, 6),
-            "middle": self._finger_is_up(lms, 12, 10),
-            "ring": self._finger_is_up(lms, 16, 14),
-            "pinky": self._finger_is_up(lms, 20, 18),
-        }
-        total = sum(1 for v in finger_up.values() if v) + (1 if thumb_extended else 0)
-
-        detected = None
-
-        if self._detect_pinch(lms):
-            detected = "PINCH"
-        elif total == 1 and thumb_extended and not any(finger_up.values()):
-            # Thumb-up only to switch modes (avoids 2-finger conflict with lights)
-            detected = "MODE_SWITCH"
-        elif total >= 4 and thumb_extended:
-            detected = "OPEN_HAND"
-        elif total <= 1 and not thumb_extended:
-            detected = "FIST"
-        elif total == 1 and not thumb_extended:
-            # pointing
-            index_tip = (lms[8].x, lms[8].y)
-            index_pip = (lms[6].x, lms[6].y)
-            index_mcp = (lms[5].x, lms[5].y)
-            wrist = (lms[0].x, lms[0].y)
-
-            tip_to_mcp_x = index_tip[0] - index_mcp[0]
-            tip_to_pip_x = index_tip[0] - index_pip[0]
-            wrist_to_tip_x = index_tip[0] - wrist[0]
+        detected = STATE_GESTURES.get(state)
+        if detected == "POINT":
+            # x offsets of the index tip from its MCP, PIP and the wrist
+            tip_to_mcp_x, tip_to_pip_x, wrist_to_tip_x = pts[8, 0] - pts[[5, 6, 0], 0]
 
             # Weighted average for stability
             combined_x = (tip_to_mcp_x * 0.6) + (tip_to_pip_x * 0.3) + (wrist_to_tip_x * 0.1)
-            if combined_x > POINT_X_THRESH:
-                detected = "POINT_LEFT"
-            elif combined_x < -POINT_X_THRESH:
-                detected = "POINT_RIGHT"
-            else:
-                detected = "POINT_RIGHT"
+            # Ambiguous (near-vertical) pointing also resolves to POINT_RIGHT
+            detected = "POINT_LEFT" if combined_x > POINT_X_THRESH else "POINT_RIGHT"
 
-        self.action_buffer.add(detected)
-        return self.action_buffer.stable_value(ACTION_STABLE_MIN, ACTION_STABLE_FRACTION)
+        return detected
 
 
 class ModeDetector:
-    MODE_MAP = {
-        1: "TEMPERATURE",
-        2: "LIGHTS",
-        3: "BLINDS",
-        4: "DOOR",
-    }
+    # Indexed by finger count (0-5); only 1-4 select a mode
+    MODE_MAP = (None, "TEMPERATURE", "LIGHTS", "BLINDS", "DOOR", None)
 
     def finger_count_to_mode(self, count):
-        return self.MODE_MAP.get(count)
+        if count is None:
+            return None
+        return self.MODE_MAP[count]
 
 
 class CommandMapper:
+    COMMAND_MAP = {
+        ("TEMPERATURE", "OPEN_HAND"): ("TEMPERATURE", "AC_ON"),
+        ("TEMPERATURE", "FIST"): ("TEMPERATURE", "AC_OFF"),
+        ("TEMPERATURE", "POINT_RIGHT"): ("TEMPERATURE", "UP"),
+        ("TEMPERATURE", "POINT_LEFT"): ("TEMPERATURE", "DOWN"),
+        ("LIGHTS", "OPEN_HAND"): ("LIGHTS", "ON"),
+        ("LIGHTS", "FIST"): ("LIGHTS", "OFF"),
+        ("LIGHTS", "POINT_RIGHT"): ("LIGHTS", "BRIGHT"),
+        ("LIGHTS", "POINT_LEFT"): ("LIGHTS", "DIM"),
+        ("BLINDS", "OPEN_HAND"): ("BLINDS", "OPEN"),
+        ("BLINDS", "FIST"): ("BLINDS", "CLOSE"),
+        ("BLINDS", "POINT_RIGHT"): ("BLINDS", "OPEN"),   # slide right to open more
+        ("BLINDS", "POINT_LEFT"): ("BLINDS", "CLOSE"),   # slide left to close more
+        ("DOOR", "OPEN_HAND"): ("DOOR", "UNLOCK"),
+        ("DOOR", "FIST"): ("DOOR", "LOCK"),
+    }
+
     def map_to_command(self, mode, action):
-        if mode == "TEMPERATURE":
-            if action == "OPEN_HAND":
-                return ("TEMPERATURE", "AC_ON")
-            if action == "FIST":
-                return ("TEMPERATURE", "AC_OFF")
-            if action == "POINT_RIGHT":
-                return ("TEMPERATURE", "UP")
-            if action == "POINT_LEFT":
-                return ("TEMPERATURE", "DOWN")
-
-        elif mode == "LIGHTS":
-            if action == "OPEN_HAND":
-                return ("LIGHTS", "ON")
-            if action == "FIST":
-                return ("LIGHTS", "OFF")
-            if action == "POINT_RIGHT":
-                return ("LIGHTS", "BRIGHT")
-            if action == "POINT_LEFT":
-                return ("LIGHTS", "DIM")
-
-        elif mode == "BLINDS":
-            if action == "OPEN_HAND":
-                return ("BLINDS", "OPEN")
-            if action == "FIST":
-                return ("BLINDS", "CLOSE")
-            if action == "POINT_RIGHT":
-                return ("BLINDS", "OPEN")  # slide right to open more
-            if action == "POINT_LEFT":
-                return ("BLINDS", "CLOSE") # slide left to close more
-
-        elif mode == "DOOR":
-            if action == "OPEN_HAND":
-                return ("DOOR", "UNLOCK")
-            if action == "FIST":
-                return ("DOOR", "LOCK")
-
-        return (None, None)
+        return self.COMMAND_MAP.get((mode, action), (None, None))
 
 
 class GestureMQTTPublisher:
     def __init__(self):
         self.mqtt_client = None
+        self.connected = threading.Event()
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f'[OK] MQTT connected to {MQTTConfig.BROKER}:{MQTTConfig.PORT}')
             print(f'[OK] Publishing to {MQTTConfig.TOPIC}')
+            self.connected.set()
         else:
             print(f'[FAIL] MQTT connection failed: {rc}')
 
@@ -351,7 +526,7 @@ class GestureMQTTPublisher:
 
     def setup_mqtt(self):
         try:
-            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-gesture2-{str(uuid.uuid1())}"
+            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-gesture2-{os.getpid()}-{time.monotonic_ns()}"
             self.mqtt_client = mqtt.Client(client_id)
             if MQTTConfig.USERNAME and MQTTConfig.PASSWORD:
                 self.mqtt_client.username_pw_set(MQTTConfig.USERNAME, MQTTConfig.PASSWORD)
@@ -359,7 +534,9 @@ class GestureMQTTPublisher:
             self.mqtt_client.on_publish = self.on_publish
             self.mqtt_client.connect(MQTTConfig.BROKER, port=MQTTConfig.PORT, keepalive=MQTTConfig.KEEPALIVE)
             self.mqtt_client.loop_start()
-            time.sleep(1)
+            # Continue as soon as the CONNACK arrives instead of after a fixed delay
+            if not self.connected.wait(MQTT_CONNECT_TIMEOUT):
+                print('[WARN] MQTT not connected yet; paho will keep retrying in the background')
             return True
         except Exception as e:
             print(f'[WARN] MQTT setup failed: {e}')
@@ -374,7 +551,7 @@ class GestureMQTTPublisher:
             'timestamp': command_data.get('timestamp'),
             'finger_count': command_data.get('finger_count'),
         }
-        result = self.mqtt_client.publish(MQTTConfig.TOPIC, json.dumps(payload))
+        result = self.mqtt_client.publish(MQTTConfig.TOPIC, encode_json(payload))
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
             print(f"[{command_data.get('timestamp')}] COMMAND: {payload['category']} -> {payload['action']} = {payload['value']}")
             return True
@@ -408,46 +585,38 @@ def main():
     locked_mode = None
     last_action = None
     last_action_time = 0
-    mode_lock_frames = 0
-    last_finger_count = None
     mode_lock_time = 0
     pinch_start_time = None
 
     try:
         while True:
+            display.flush()  # push any text held back by the display rate limit
+
+            # One capture + inference per new camera frame feeds both the mode and action
+            # smoothing; analyze_frame() blocks until the frame arrives, so no sleep is needed
+            if not recognizer.analyze_frame():
+                continue
+
             if not mode_locked:
                 finger_count = recognizer.get_finger_count()
                 if finger_count is None:
-                    mode_lock_frames = 0
-                    last_finger_count = None
-                    time.sleep(FRAME_SLEEP)
                     continue
 
                 if 1 <= finger_count <= 4:
                     preview_mode = mode_detector.finger_count_to_mode(finger_count)
                     display.show_mode_preview(preview_mode)
 
-                    if finger_count == last_finger_count:
-                        mode_lock_frames += 1
-                    else:
-                        mode_lock_frames = 1
-                        last_finger_count = finger_count
-
-                    if mode_lock_frames >= MODE_HOLD_FRAMES:
+                    if recognizer.mode_streak >= MODE_HOLD_FRAMES:
                         locked_mode = mode_detector.finger_count_to_mode(finger_count)
                         if locked_mode:
                             mode_locked = True
-                            mode_lock_time = time.time()
+                            mode_lock_time = time.monotonic()
                             print(f"\n[MODE LOCKED] {locked_mode}")
                             print("[READY] Waiting for action gesture...")
                             display.show_mode_locked(locked_mode)
-                        mode_lock_frames = 0
-                else:
-                    mode_lock_frames = 0
-                    last_finger_count = None
 
             else:
-                current_time = time.time()
+                current_time = time.monotonic()
                 # Timeout back to selection
                 if (current_time - mode_lock_time) >= MODE_TIMEOUT:
                     print(f"\n[TIMEOUT] Resetting to mode selection...")
@@ -456,7 +625,7 @@ def main():
                     locked_mode = None
                     last_action = None
                     pinch_start_time = None
-                    time.sleep(FRAME_SLEEP)
+                    recognizer.reset_mode_streak()
                     continue
 
                 action = recognizer.get_action_gesture()
@@ -471,8 +640,8 @@ def main():
                         locked_mode = None
                         last_action = None
                         pinch_start_time = None
+                        recognizer.reset_mode_streak()
                         display.show_intro()
-                        time.sleep(FRAME_SLEEP)
                         continue
                 else:
                     pinch_start_time = None
@@ -484,8 +653,8 @@ def main():
                     locked_mode = None
                     last_action = None
                     pinch_start_time = None
+                    recognizer.reset_mode_streak()
                     display.show_intro()
-                    time.sleep(FRAME_SLEEP)
                     continue
 
                 if action is not None and action != "PINCH":
@@ -506,7 +675,7 @@ def main():
                                 "action": cmd_action,
                                 "value": cmd_value,
                                 "timestamp": time.strftime('%H:%M:%S'),
-                                "finger_count": recognizer.mode_buffer.stable_value()  # best-effort info
+                                "finger_count": recognizer.get_finger_count()  # best-effort info
                             }
                             if mqtt_publisher.publish_command(payload):
                                 display.show_action(locked_mode, cmd_value)
@@ -517,8 +686,6 @@ def main():
 
                         last_action = action
 
-            time.sleep(FRAME_SLEEP)
-
     except KeyboardInterrupt:
         print("\n\nStopping...")
     finally:
@@ -539,7 +706,7 @@ if __name__ == "__main__":
 #   - Actions: OPEN_HAND (on/open/unlock), FIST (off/close/lock), POINT_LEFT/RIGHT (down/dim/close vs up/bright/open),
 #              PINCH (thumb-index pinch) held for exit/switch.
 # Mode logic:
-#   - Mode locks after MODE_HOLD_FRAMES stable readings; stays locked until explicit pinch exit or inactivity timeout.
+#   - Mode locks after MODE_HOLD_FRAMES identical consecutive finger counts; stays locked until explicit pinch exit or inactivity timeout.
 #   - Actions are debounced with temporal smoothing and cooldown; slide actions can repeat while held.
 # Assumptions/limits:
 #   - Single hand, front-facing camera. Good lighting improves landmark stability.
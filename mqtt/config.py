@@ -48,4 +48,6 @@ class WebConfig:
     PORT = int(os.getenv('PORT', '8080'))
     SECRET_KEY = os.getenv('SECRET_KEY', 'button-dashboard-secret-key')
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+    # Socket.IO server backend ('eventlet', 'gevent', 'threading'); None = auto-detect
+    ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE') or None
 
@@ -9,9 +9,16 @@ import digitalio
 import board
 import paho.mqtt.client as mqtt
 import json
-import uuid
+import os
 from .config import MQTTConfig, ButtonConfig
 
+# orjson is optional; it serializes straight to bytes, which paho publishes as-is
+try:
+    from orjson import dumps as encode_json
+except ImportError:
+    def encode_json(obj):
+        return json.dumps(obj).encode()
+
 
 class ButtonPublisher:
     """Publishes button state changes to MQTT"""
@@ -51,7 +58,7 @@ class ButtonPublisher:
     def setup_mqtt(self):
         """Setup and connect MQTT client"""
         try:
-            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-{str(uuid.uuid1())}"
+            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-{os.getpid()}-{time.monotonic_ns()}"
             self.mqtt_client = mqtt.Client(client_id)
             
             if MQTTConfig.USERNAME and MQTTConfig.PASSWORD:
@@ -75,7 +82,7 @@ class ButtonPublisher:
             'button_id': button_id,
             'state': state
         }
-        result = self.mqtt_client.publish(MQTTConfig.TOPIC, json.dumps(payload))
+        result = self.mqtt_client.publish(MQTTConfig.TOPIC, encode_json(payload))
         
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
             state_str = "PRESSED" if state else "RELEASED"
@@ -6,7 +6,8 @@ Handles MQTT message reception and state management for the web dashboard.
 
 import paho.mqtt.client as mqtt
 import json
-import uuid
+import os
+import time
 from datetime import datetime
 from mqtt.config import MQTTConfig
 
@@ -177,7 +178,7 @@ class ButtonSubscriber:
     def setup(self):
         """Setup and connect MQTT client"""
         try:
-            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-sub-{str(uuid.uuid1())}"
+            client_id = f"{MQTTConfig.CLIENT_ID_PREFIX}-sub-{os.getpid()}-{time.monotonic_ns()}"
             self.mqtt_client = mqtt.Client(client_id)
             
             if MQTTConfig.USERNAME and MQTTConfig.PASSWORD:
@@ -189,7 +190,6 @@ class ButtonSubscriber:
             self.mqtt_client.connect(MQTTConfig.BROKER, port=MQTTConfig.PORT, keepalive=MQTTConfig.KEEPALIVE)
             self.mqtt_client.loop_start()
             
-            import time
             time.sleep(1)
             return True
         except Exception as e:
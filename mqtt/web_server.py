@@ -14,7 +14,17 @@ import os
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = WebConfig.SECRET_KEY
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Payloads are small JSON events and clients never send anything larger than a
+# handshake, so skip compressing them and reject oversized client packets early
+socketio = SocketIO(
+    app,
+    async_mode=WebConfig.ASYNC_MODE,
+    cors_allowed_origins="*",
+    http_compression=False,
+    max_http_buffer_size=2 ** 14,
+    ping_interval=20,
+    ping_timeout=20
+)
 
 # Global MQTT subscriber
 mqtt_subscriber = None
@@ -770,7 +780,7 @@ def main():
         print("[WARN] MQTT setup failed, continuing without MQTT")
     
     # Print access info
-    print(f"[OK] Web server starting on http://{WebConfig.HOST}:{WebConfig.PORT}")
+    print(f"[OK] Web server starting on http://{WebConfig.HOST}:{WebConfig.PORT} ({socketio.async_mode})")
     print(f"[OK] 3D Room available at http://{WebConfig.HOST}:{WebConfig.PORT}/3d-room")
     print("=" * 60)
     
@@ -3,10 +3,37 @@
 Entry point for gesture controller with MQTT publishing
 
 Run this script to start gesture recognition and publish commands to MQTT.
+
+Optional scheduling tweaks for Pi-class boards (Linux):
+    GESTURE_CPU_AFFINITY=2,3   pin the controller to these cores
+    GESTURE_NICE=-5            adjust niceness (negative values need root/CAP_SYS_NICE)
 """
 
+import os
+
 from gesture_controller import main
 
+
+def apply_scheduling():
+    """Apply CPU affinity / niceness from the environment before any worker threads start"""
+    cpus = os.environ.get('GESTURE_CPU_AFFINITY')
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {int(cpu) for cpu in cpus.split(',')})
+            print(f"[OK] Pinned to CPUs {sorted(os.sched_getaffinity(0))}")
+        except (ValueError, OSError) as e:
+            print(f"[WARN] Could not set CPU affinity: {e}")
+
+    nice = os.environ.get('GESTURE_NICE')
+    if nice:
+        try:
+            print(f"[OK] Niceness now {os.nice(int(nice))}")
+        except (ValueError, OSError) as e:
+            print(f"[WARN] Could not change priority: {e}")
+
+
 if __name__ == '__main__':
+    # Threads inherit the affinity mask of the thread that creates them, so this has to
+    # run before main() starts the camera, MediaPipe and MQTT threads
+    apply_scheduling()
     main()
-